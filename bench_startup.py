@@ -0,0 +1,70 @@
+"""Measure SURA Connect cold-start cost.
+
+Each sample imports main.py in a fresh Python process inside a scratch
+directory, so nothing is cached between runs. Usage:
+
+    python bench_startup.py              # current tree
+    python bench_startup.py --compare HEAD~1   # also time main.py from a git revision
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    "import only (fresh dir)": ("import main", False),
+    "import + migrate (new DB)": ("import main\nif hasattr(main, 'migrate_db'): main.migrate_db()", False),
+    "import + migrate (up-to-date DB)": ("import main\nif hasattr(main, 'migrate_db'): main.migrate_db()", True),
+}
+
+TIMER = """
+import time
+_start = time.perf_counter()
+{code}
+print(time.perf_counter() - _start)
+"""
+
+
+def run_once(main_source, code, warm_db):
+    workdir = tempfile.mkdtemp(prefix="sura-bench-")
+    try:
+        with open(os.path.join(workdir, "main.py"), "w", encoding="utf-8") as f:
+            f.write(main_source)
+        env = dict(os.environ, SENDER_PASSWORD="")
+        script = TIMER.format(code=code)
+        if warm_db:
+            # Create the database first so only the steady-state restart is timed
+            subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env, check=True, capture_output=True)
+        out = subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env, check=True, capture_output=True, text=True)
+        return float(out.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench(label, main_source, runs):
+    print(f"\n{label}")
+    for name, (code, warm_db) in SCENARIOS.items():
+        samples = [run_once(main_source, code, warm_db) for _ in range(runs)]
+        print(f"  {name:<34} median {statistics.median(samples) * 1000:8.1f} ms   min {min(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--compare", metavar="REV", help="git revision whose main.py to benchmark as a baseline")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline = subprocess.run(["git", "show", f"{args.compare}:main.py"], cwd=HERE, check=True, capture_output=True, text=True).stdout
+        bench(f"main.py @ {args.compare}", baseline, args.runs)
+    with open(os.path.join(HERE, "main.py"), encoding="utf-8") as f:
+        bench("main.py (working tree)", f.read(), args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,21 @@
 import sqlite3
 import os
 import json
-import smtplib
-from email.message import EmailMessage
 from datetime import datetime
 from fastapi import FastAPI, Request, BackgroundTasks  # type: ignore
 from pydantic import BaseModel  # type: ignore
-from fastapi.responses import HTMLResponse, JSONResponse  # type: ignore
-from fastapi.staticfiles import StaticFiles  # type: ignore
-from fastapi.templating import Jinja2Templates  # type: ignore
+from fastapi.responses import HTMLResponse  # type: ignore
 from fastapi import HTTPException  # type: ignore
 import hashlib
+import threading
+import io
+import hmac
+import secrets
+import time
+import re
+from contextlib import contextmanager, asynccontextmanager
+from fastapi.responses import StreamingResponse  # type: ignore
+from starlette.concurrency import run_in_threadpool  # type: ignore
 
 DB_FILE = "sura.db"
 SMTP_SERVER = "smtp.gmail.com"
@@ -19,10 +24,85 @@ SMTP_PORT = 587
 SENDER_EMAIL = os.environ.get("SENDER_EMAIL", "san01aug@gmail.com")
 SENDER_PASSWORD = os.environ.get("SENDER_PASSWORD", "ebad pzks oixl uadc")
 
+# Closed requests older than ARCHIVE_AFTER_DAYS are moved out of the live tables
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+CLOSED_STATUSES = {
+    "requests": ("Accepted", "Declined - No NGOs left", "No NGO Available"),
+    "ngo_requests": ("Accepted", "No Restaurants Available"),
+}
+REQUESTS_COLUMNS = "id, restaurant, contact, location, foodType, quantity, expiry, email, notes, status, ngoAssigned, history, created_at"
+NGO_REQUESTS_COLUMNS = "id, ngo_name, ngo_email, location, food_type_needed, quantity_needed, urgency, status, restaurant_assigned, history, created_at"
+TABLE_COLUMNS = {"requests": REQUESTS_COLUMNS, "ngo_requests": NGO_REQUESTS_COLUMNS}
+
+# Outbound webhooks: status-change events are queued in an outbox and delivered in batches
+WEBHOOK_FLUSH_SECONDS = float(os.environ.get("WEBHOOK_FLUSH_SECONDS", "5"))
+WEBHOOK_BATCH_SIZE = int(os.environ.get("WEBHOOK_BATCH_SIZE", "200"))
+WEBHOOK_TIMEOUT_SECONDS = 10
+WEBHOOK_MAX_BACKOFF_SECONDS = 600
+# A claimed batch is owned by one dispatcher for this long; must exceed WEBHOOK_TIMEOUT_SECONDS
+WEBHOOK_LEASE_SECONDS = 60
+# Subscribers are deactivated after this many consecutive failures so they stop pinning the outbox
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "10"))
+# First retry delay; doubles per failure. Independent of the flush interval so manual flushes still back off
+WEBHOOK_RETRY_BASE_SECONDS = 5
+# Events a deactivated subscriber missed are kept this long so it can be reactivated without losing them
+WEBHOOK_RETENTION_HOURS = int(os.environ.get("WEBHOOK_RETENTION_HOURS", "72"))
+# Subscribers whose outbox cursor is still honoured: active ones, and recently deactivated ones
+WEBHOOK_RETAINED = "(active = 1 OR deactivated_at >= datetime('now', ?))"
+
+# Full-text search: FTS5 index over each request table, kept in sync by triggers
+SEARCH_FIELDS = {
+    "requests": ("restaurant", "location", "foodType", "notes"),
+    "ngo_requests": ("ngo_name", "location", "food_type_needed", "urgency"),
+}
+SEARCH_SCOPES = {"donations": "requests", "ngo_requests": "ngo_requests"}
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Admission control for write endpoints: per-sender token buckets, a global
+# concurrency gate, and Idempotency-Key replay for retried submissions
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_PER_MINUTE", "10"))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_MAX_KEYS = 10000
+WRITE_CONCURRENCY = int(os.environ.get("WRITE_CONCURRENCY", "4"))
+WRITE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("WRITE_QUEUE_TIMEOUT_SECONDS", "0.5"))
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_PRUNE_SECONDS = 3600
+
+# Bulk export/import. Partner directories never export password hashes.
+EXPORT_BATCH_SIZE = 500
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = {
+    "requests": REQUESTS_COLUMNS,
+    "ngo_requests": NGO_REQUESTS_COLUMNS,
+    "ngos": "id, name, location, email, contact",
+    "restaurants": "id, name, location, email, contact",
+}
+# (column, SQL default) -- a default of None marks the column as required
+IMPORT_COLUMNS = {
+    "requests": [("restaurant", None), ("contact", None), ("location", None), ("foodType", None),
+                 ("quantity", None), ("expiry", None), ("email", None), ("notes", "''"),
+                 ("status", "'Pending'"), ("ngoAssigned", "'Not yet Assigned'"), ("history", "'[]'"),
+                 ("created_at", "CURRENT_TIMESTAMP")],
+    "ngo_requests": [("ngo_name", None), ("ngo_email", None), ("location", None), ("food_type_needed", None),
+                     ("quantity_needed", None), ("urgency", None), ("status", "'Pending'"),
+                     ("restaurant_assigned", "'Not yet Assigned'"), ("history", "'[]'"),
+                     ("created_at", "CURRENT_TIMESTAMP")],
+    "ngos": [("name", None), ("location", None), ("email", None), ("contact", None), ("password", "''")],
+    "restaurants": [("name", None), ("location", None), ("email", None), ("contact", None), ("password", "''")],
+}
+IMPORT_INT_COLUMNS = {"quantity", "quantity_needed"}
+# Matches hash_psw output: 16-byte salt and SHA-256 digest, hex encoded
+PASSWORD_HASH_RE = re.compile(r"^[0-9a-f]{32}\$[0-9a-f]{64}$")
+
 def send_real_email(to_email, subject, body_html):
     if SENDER_EMAIL == "your_gmail_address@gmail.com" or not SENDER_PASSWORD:
         print(f"Skipping REAL email to {to_email} because SENDER credentials are not set.")
         return False
+    # Imported lazily: smtplib and the email package are slow to import and only needed here
+    import smtplib
+    from email.message import EmailMessage
     try:
         msg = EmailMessage()
         msg['Subject'] = subject
@@ -42,9 +122,9 @@ def send_real_email(to_email, subject, body_html):
         print(f"Error sending email: {e}")
         return False
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+# Each migration runs exactly once per database, in order. Statements use
+# IF NOT EXISTS so databases created before versioning upgrade cleanly.
+def migrate_base_tables(cursor):
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS ngos (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -97,7 +177,88 @@ def init_db():
             password TEXT NOT NULL
         )
     """)
-    
+
+def migrate_archive_tables(cursor):
+    # Archive tables hold closed requests; ids are kept so links stay valid
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS requests_archive (
+            id INTEGER PRIMARY KEY,
+            restaurant TEXT,
+            contact TEXT,
+            location TEXT,
+            foodType TEXT,
+            quantity INTEGER,
+            expiry TEXT,
+            email TEXT,
+            notes TEXT,
+            status TEXT,
+            ngoAssigned TEXT,
+            history TEXT,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ngo_requests_archive (
+            id INTEGER PRIMARY KEY,
+            ngo_name TEXT NOT NULL,
+            ngo_email TEXT NOT NULL,
+            location TEXT NOT NULL,
+            food_type_needed TEXT NOT NULL,
+            quantity_needed INTEGER NOT NULL,
+            urgency TEXT NOT NULL,
+            status TEXT,
+            restaurant_assigned TEXT,
+            history TEXT,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_created ON requests (status, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ngo_requests_status_created ON ngo_requests (status, created_at)")
+
+def migrate_webhooks(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            secret TEXT NOT NULL,
+            active INTEGER DEFAULT 1,
+            last_delivered_id INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_table TEXT NOT NULL,
+            request_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def migrate_search_index(cursor):
+    for table, fields in SEARCH_FIELDS.items():
+        create_search_index(cursor, table, fields)
+
+def migrate_idempotency_keys(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            response TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (endpoint, key)
+        )
+    """)
+
+def migrate_seed_ngos(cursor):
     # Seed NGOs if empty
     cursor.execute("SELECT COUNT(*) FROM ngos")
     if cursor.fetchone()[0] == 0:
@@ -110,9 +271,84 @@ def init_db():
             ("Care & Share", "Tambaram", "v.k.sunanda12@gmail.com", "7765894159", default_pwd),
         ]
         cursor.executemany("INSERT INTO ngos (name, location, email, contact, password) VALUES (?, ?, ?, ?, ?)", ngos_data)
-        
-    conn.commit()
-    conn.close()
+
+def migrate_webhook_leases(cursor):
+    cursor.execute("ALTER TABLE webhook_subscriptions ADD COLUMN leased_until REAL DEFAULT 0")
+
+def migrate_webhook_deactivated_at(cursor):
+    cursor.execute("ALTER TABLE webhook_subscriptions ADD COLUMN deactivated_at TIMESTAMP")
+
+def migrate_archive_search_index(cursor):
+    for table, fields in SEARCH_FIELDS.items():
+        create_search_index(cursor, f"{table}_archive", fields)
+
+MIGRATIONS = [
+    migrate_base_tables,
+    migrate_archive_tables,
+    migrate_webhooks,
+    migrate_search_index,
+    migrate_idempotency_keys,
+    migrate_seed_ngos,
+    migrate_webhook_leases,
+    migrate_archive_search_index,
+    migrate_webhook_deactivated_at,
+]
+
+def migrate_db(db_file=None):
+    """Apply pending migrations and return (old_version, new_version).
+
+    The schema version lives in PRAGMA user_version. Migrations run inside an
+    EXCLUSIVE transaction, so when several workers start together one migrates
+    and the rest wait, then find nothing left to do.
+    """
+    conn = sqlite3.connect(db_file or DB_FILE, timeout=30)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return version, version
+        conn.execute("BEGIN EXCLUSIVE")
+        # Re-read under the lock in case another worker migrated meanwhile
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        cursor = conn.cursor()
+        for migration in MIGRATIONS[version:]:
+            migration(cursor)
+        conn.execute(f"PRAGMA user_version = {max(version, len(MIGRATIONS))}")
+        conn.commit()
+        return version, max(version, len(MIGRATIONS))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def create_search_index(cursor, table, fields):
+    fts = f"{table}_fts"
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,))
+    exists = cursor.fetchone()
+    columns = ", ".join(fields)
+    new_columns = ", ".join(f"new.{f}" for f in fields)
+    old_columns = ", ".join(f"old.{f}" for f in fields)
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id', prefix='2 3')")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_columns});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+        END
+    """)
+    # Status and history updates don't touch the indexed columns, so they skip the index
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+            INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_columns});
+        END
+    """)
+    if not exists:
+        # Index rows that predate the search table
+        cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
 
 def hash_psw(password: str) -> str:
     salt = os.urandom(16)
@@ -150,12 +386,22 @@ class LoginNGORequest(BaseModel):
     email: str
     password: str
 
-init_db()
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app):
+    # Nothing touches the database at import time; schema setup happens here
+    # (or once via `python main.py migrate` with MIGRATE_ON_STARTUP=0)
+    if MIGRATE_ON_STARTUP:
+        await run_in_threadpool(migrate_db)
+    start_background_workers()
+    yield
+    stop_background_workers()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-def get_db():
-    conn = sqlite3.connect(DB_FILE)
+def get_db(check_same_thread=True):
+    conn = sqlite3.connect(DB_FILE, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -169,6 +415,10 @@ class DonationRequest(BaseModel):
     email: str
     notes: str = ""
 
+class WebhookSubscriptionRequest(BaseModel):
+    url: str
+    secret: str = ""
+
 class NGOFoodRequest(BaseModel):
     ngo_name: str
     ngo_email: str
@@ -179,16 +429,600 @@ class NGOFoodRequest(BaseModel):
 
 def log_event(req_id, event, conn, table="requests"):
     cursor = conn.cursor()
-    cursor.execute(f"SELECT history FROM {table} WHERE id = ?", (req_id,))
+    cursor.execute(f"SELECT * FROM {table} WHERE id = ?", (req_id,))
     row = cursor.fetchone()
     if row:
         history = json.loads(row["history"])
         history.append({"time": datetime.now().isoformat(), "event": event})
         cursor.execute(f"UPDATE {table} SET history = ? WHERE id = ?", (json.dumps(history), req_id))
+        enqueue_webhook_event(cursor, table, row, event)
+        conn.commit()
+
+def archive_closed_requests(table, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move closed rows of `table` older than `older_than_days` into `<table>_archive`.
+
+    Rows are moved in batches of `batch_size`, one transaction per batch, so the
+    writer lock is only held briefly. Returns the number of rows archived.
+    """
+    statuses = CLOSED_STATUSES[table]
+    columns = TABLE_COLUMNS[table]
+    placeholders = ", ".join("?" for _ in statuses)
+    conn = get_db()
+    cursor = conn.cursor()
+    moved = 0
+    try:
+        while True:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT id FROM {table}
+                WHERE status IN ({placeholders}) AND created_at < datetime('now', ?)
+                ORDER BY id LIMIT ?
+            """, (*statuses, f"-{older_than_days} days", batch_size))
+            ids = [row["id"] for row in cursor.fetchall()]
+            if not ids:
+                conn.commit()
+                break
+            id_placeholders = ", ".join("?" for _ in ids)
+            # Delete-then-insert rather than INSERT OR REPLACE, so the archive search index triggers fire
+            cursor.execute(f"DELETE FROM {table}_archive WHERE id IN ({id_placeholders})", ids)
+            cursor.execute(f"INSERT INTO {table}_archive ({columns}) SELECT {columns} FROM {table} WHERE id IN ({id_placeholders})", ids)
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({id_placeholders})", ids)
+            conn.commit()
+            moved += len(ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return moved
+
+def run_archiver():
+    counts = {table: archive_closed_requests(table) for table in CLOSED_STATUSES}
+    if any(counts.values()):
+        print(f"Archived closed requests: {counts}")
+    return counts
+
+_background_stop = threading.Event()
+_background_threads = []
+
+def archiver_loop():
+    while not _background_stop.wait(ARCHIVE_INTERVAL_SECONDS):
+        try:
+            run_archiver()
+        except Exception as e:
+            print(f"Error archiving requests: {e}")
+
+def idempotency_prune_loop():
+    while not _background_stop.wait(IDEMPOTENCY_PRUNE_SECONDS):
+        try:
+            prune_idempotency_keys()
+        except Exception as e:
+            print(f"Error pruning idempotency keys: {e}")
+
+_rate_buckets = {}
+_rate_lock = threading.Lock()
+_write_slots = threading.BoundedSemaphore(WRITE_CONCURRENCY)
+
+def check_rate_limit(*keys):
+    """Take one token from every bucket in `keys`, or none if any is empty.
+
+    Returns 0 when the request is allowed, otherwise the seconds until the
+    emptiest bucket refills enough to admit it. A rate of 0 disables limiting.
+    """
+    if RATE_LIMIT_PER_MINUTE <= 0:
+        return 0
+    rate = RATE_LIMIT_PER_MINUTE / 60.0
+    now = time.monotonic()
+    with _rate_lock:
+        if len(_rate_buckets) > RATE_LIMIT_MAX_KEYS:
+            # Forget buckets that have refilled completely; they behave like new ones
+            idle = RATE_LIMIT_BURST / rate
+            for key in [k for k, (_, last) in _rate_buckets.items() if now - last > idle]:
+                del _rate_buckets[key]
+        levels = {}
+        for key in keys:
+            tokens, last = _rate_buckets.get(key, (RATE_LIMIT_BURST, now))
+            levels[key] = min(RATE_LIMIT_BURST, tokens + (now - last) * rate)
+        short = [1 - tokens for tokens in levels.values() if tokens < 1]
+        if short:
+            return max(short) / rate
+        for key, tokens in levels.items():
+            _rate_buckets[key] = (tokens - 1, now)
+    return 0
+
+@contextmanager
+def write_slot():
+    # Shed load here instead of letting requests pile up behind SQLite's writer lock
+    if not _write_slots.acquire(timeout=WRITE_QUEUE_TIMEOUT_SECONDS):
+        raise HTTPException(status_code=429, detail="Server busy, please retry shortly", headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        _write_slots.release()
+
+def idempotency_ttl():
+    return f"-{IDEMPOTENCY_TTL_HOURS} hours"
+
+def prune_idempotency_keys():
+    # Only reclaims space; lookups ignore expired keys whether or not this has run
+    conn = get_db()
+    conn.execute("DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)", (idempotency_ttl(),))
+    conn.commit()
+    conn.close()
+
+def find_idempotency_key(cursor, endpoint, key):
+    cursor.execute("""
+        SELECT fingerprint, response FROM idempotency_keys
+        WHERE endpoint = ? AND key = ? AND created_at >= datetime('now', ?)
+    """, (endpoint, key, idempotency_ttl()))
+    return cursor.fetchone()
+
+def replay_idempotent(row, fingerprint):
+    # Return the stored response for a reused key, or explain why it can't be replayed
+    if row is None:
+        # The claim we lost to was released by a failed request in the meantime
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key was just retried; please retry", headers={"Retry-After": "1"})
+    if row["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+    if row["response"] is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress", headers={"Retry-After": "1"})
+    return json.loads(row["response"])
+
+def guarded_write(request, endpoint, body, rate_keys, handler):
+    """Run a write handler behind idempotency replay, rate limiting and the write gate.
+
+    A repeated Idempotency-Key returns the stored response without running the
+    handler again, so retried submissions neither consume tokens nor create rows.
+    The key is only claimed once the request has been admitted, so rejected
+    requests never write to the database.
+    """
+    key = request.headers.get("Idempotency-Key")
+    fingerprint = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+    if key:
+        conn = get_db()
+        row = find_idempotency_key(conn.cursor(), endpoint, key)
+        conn.close()
+        if row:
+            return replay_idempotent(row, fingerprint)
+
+    with write_slot():
+        # Tokens are taken only once the gate admits the request, so a 429 "Server busy"
+        # doesn't also count against the sender
+        retry_after = check_rate_limit(*((kind, value.strip().lower()) for kind, value in rate_keys))
+        if retry_after:
+            raise HTTPException(status_code=429, detail="Too many requests, please slow down", headers={"Retry-After": str(int(retry_after) + 1)})
+        if key:
+            conn = get_db()
+            cursor = conn.cursor()
+            # An expired row with the same key would otherwise block the claim
+            cursor.execute("DELETE FROM idempotency_keys WHERE endpoint = ? AND key = ? AND created_at < datetime('now', ?)", (endpoint, key, idempotency_ttl()))
+            cursor.execute("INSERT OR IGNORE INTO idempotency_keys (endpoint, key, fingerprint) VALUES (?, ?, ?)", (endpoint, key, fingerprint))
+            conn.commit()
+            if cursor.rowcount != 1:
+                # A concurrent request with the same key claimed it first
+                row = find_idempotency_key(cursor, endpoint, key)
+                conn.close()
+                return replay_idempotent(row, fingerprint)
+            conn.close()
+        try:
+            response = handler()
+        except Exception:
+            if key:
+                # Release the key so the client can retry
+                conn = get_db()
+                conn.execute("DELETE FROM idempotency_keys WHERE endpoint = ? AND key = ? AND response IS NULL", (endpoint, key))
+                conn.commit()
+                conn.close()
+            raise
+        if key:
+            conn = get_db()
+            conn.execute("UPDATE idempotency_keys SET response = ? WHERE endpoint = ? AND key = ?", (json.dumps(response), endpoint, key))
+            conn.commit()
+            conn.close()
+    return response
+
+def enqueue_webhook_event(cursor, table, row, event):
+    # Only queue events when someone is listening (or may be reactivated), so the outbox can't grow unbounded
+    cursor.execute(f"SELECT 1 FROM webhook_subscriptions WHERE {WEBHOOK_RETAINED} LIMIT 1", (f"-{WEBHOOK_RETENTION_HOURS} hours",))
+    if not cursor.fetchone():
+        return
+    snapshot = {k: row[k] for k in row.keys() if k != "history"}
+    cursor.execute(
+        "INSERT INTO webhook_outbox (request_table, request_id, event, payload) VALUES (?, ?, ?, ?)",
+        (table, row["id"], event, json.dumps(snapshot))
+    )
+
+def sign_payload(secret, body):
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def coalesce_events(rows):
+    """Collapse outbox rows into one entry per request, in order of first appearance.
+
+    Each entry carries the latest snapshot plus every event for that request in
+    the order it happened, so receivers see one update per request per batch.
+    """
+    entries = {}
+    for row in rows:
+        key = (row["request_table"], row["request_id"])
+        snapshot = json.loads(row["payload"])
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = {"table": row["request_table"], "request_id": row["request_id"], "events": []}
+        entry["status"] = snapshot.get("status")
+        entry["request"] = snapshot
+        entry["events"].append({"id": row["id"], "event": row["event"], "time": row["created_at"]})
+    return list(entries.values())
+
+def deliver_webhook(url, secret, body):
+    import urllib.request
+    http_req = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "User-Agent": "SURA-Connect-Webhooks",
+        "X-SURA-Signature": sign_payload(secret, body),
+    })
+    with urllib.request.urlopen(http_req, timeout=WEBHOOK_TIMEOUT_SECONDS) as resp:
+        return resp.status
+
+def claim_webhook_subscription(conn, sub_id):
+    """Lease a due subscriber so only one worker sends its next batch.
+
+    Returns the subscription row if this caller won the lease, else None.
+    """
+    cursor = conn.cursor()
+    now = time.time()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        UPDATE webhook_subscriptions SET leased_until = ?
+        WHERE id = ? AND active = 1 AND next_attempt_at <= ? AND leased_until <= ?
+    """, (now + WEBHOOK_LEASE_SECONDS, sub_id, now, now))
+    claimed = cursor.rowcount == 1
+    sub = None
+    if claimed:
+        # Re-read under the lease: another worker may have advanced the cursor meanwhile
+        cursor.execute("SELECT * FROM webhook_subscriptions WHERE id = ?", (sub_id,))
+        sub = cursor.fetchone()
+    conn.commit()
+    return sub
+
+def dispatch_webhooks():
+    """Deliver one batch of pending events to every due subscriber.
+
+    Each subscriber has its own cursor into the outbox; it only advances after a
+    2xx response, so failed batches are retried in order with exponential backoff.
+    Batches are claimed with a lease first, so concurrent dispatchers (several
+    workers, or a manual flush) never send the same batch twice.
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    delivered = 0
+    try:
+        cursor.execute("SELECT id FROM webhook_subscriptions WHERE active = 1 AND next_attempt_at <= ? AND leased_until <= ?", (time.time(), time.time()))
+        for sub_id in [row["id"] for row in cursor.fetchall()]:
+            sub = claim_webhook_subscription(conn, sub_id)
+            if sub is None:
+                continue
+            cursor.execute("SELECT * FROM webhook_outbox WHERE id > ? ORDER BY id LIMIT ?", (sub["last_delivered_id"], WEBHOOK_BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                cursor.execute("UPDATE webhook_subscriptions SET leased_until = 0 WHERE id = ?", (sub_id,))
+                conn.commit()
+                continue
+            last_id = rows[-1]["id"]
+            body = json.dumps({"subscription_id": sub["id"], "delivery_id": last_id, "updates": coalesce_events(rows)}).encode("utf-8")
+            try:
+                deliver_webhook(sub["url"], sub["secret"], body)
+            except Exception as e:
+                attempts = sub["attempts"] + 1
+                backoff = min(WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), WEBHOOK_MAX_BACKOFF_SECONDS)
+                active = 0 if attempts >= WEBHOOK_MAX_ATTEMPTS else 1
+                cursor.execute("""
+                    UPDATE webhook_subscriptions
+                    SET attempts = ?, next_attempt_at = ?, last_error = ?, active = ?, leased_until = 0,
+                        deactivated_at = CASE WHEN ? = 0 THEN CURRENT_TIMESTAMP END
+                    WHERE id = ?
+                """, (attempts, time.time() + backoff, str(e), active, active, sub["id"]))
+                conn.commit()
+                print(f"Error delivering webhook to {sub['url']}: {e}")
+                if not active:
+                    print(f"Deactivated webhook {sub['url']} after {attempts} failed attempts; reactivate within {WEBHOOK_RETENTION_HOURS}h to resume without losing events.")
+                continue
+            cursor.execute("UPDATE webhook_subscriptions SET last_delivered_id = ?, attempts = 0, next_attempt_at = 0, last_error = NULL, leased_until = 0 WHERE id = ?",
+                           (last_id, sub["id"]))
+            conn.commit()
+            delivered += len(rows)
+        # Drop events every retained subscriber has already received; subscribers deactivated
+        # longer than the retention window no longer hold the outbox
+        cursor.execute(f"""
+            DELETE FROM webhook_outbox WHERE id <= (
+                SELECT COALESCE(MIN(last_delivered_id), (SELECT MAX(id) FROM webhook_outbox))
+                FROM webhook_subscriptions WHERE {WEBHOOK_RETAINED}
+            )
+        """, (f"-{WEBHOOK_RETENTION_HOURS} hours",))
+        conn.commit()
+    finally:
+        conn.close()
+    return delivered
+
+def webhook_loop():
+    while not _background_stop.wait(WEBHOOK_FLUSH_SECONDS):
+        try:
+            dispatch_webhooks()
+        except Exception as e:
+            print(f"Error dispatching webhooks: {e}")
+
+def start_background_workers():
+    # Cleared here so a second lifespan in the same process (tests, reloads) starts fresh workers
+    _background_stop.clear()
+    workers = [(idempotency_prune_loop, "sura-idempotency-prune")]
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        workers.append((archiver_loop, "sura-archiver"))
+    if WEBHOOK_FLUSH_SECONDS > 0:
+        workers.append((webhook_loop, "sura-webhooks"))
+    for target, name in workers:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        _background_threads.append(thread)
+
+def stop_background_workers():
+    _background_stop.set()
+    # A worker may be mid-delivery; give it the webhook timeout to finish its current step
+    for thread in _background_threads:
+        thread.join(timeout=WEBHOOK_TIMEOUT_SECONDS + 5)
+    _background_threads.clear()
+
+@app.post("/api/webhooks")
+def create_webhook(req: WebhookSubscriptionRequest):
+    if not req.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="url must be http(s)")
+    secret = req.secret or secrets.token_hex(32)
+    conn = get_db()
+    cursor = conn.cursor()
+    # New subscribers only receive events from now on
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM webhook_outbox")
+    last_id = cursor.fetchone()[0]
+    cursor.execute("INSERT INTO webhook_subscriptions (url, secret, last_delivered_id) VALUES (?, ?, ?)", (req.url, secret, last_id))
+    conn.commit()
+    sub_id = cursor.lastrowid
+    conn.close()
+    # The secret is only returned once, at registration
+    return {"id": sub_id, "url": req.url, "secret": secret}
+
+@app.get("/api/webhooks")
+def list_webhooks():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, url, active, last_delivered_id, attempts, last_error, deactivated_at, created_at FROM webhook_subscriptions ORDER BY id ASC")
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+@app.post("/api/webhooks/{sub_id}/reactivate")
+def reactivate_webhook(sub_id: int):
+    conn = get_db()
+    cursor = conn.cursor()
+    # The outbox cursor is kept, so delivery resumes where it stopped (within the retention window)
+    cursor.execute("""
+        UPDATE webhook_subscriptions
+        SET active = 1, attempts = 0, next_attempt_at = 0, last_error = NULL, deactivated_at = NULL
+        WHERE id = ?
+    """, (sub_id,))
+    conn.commit()
+    updated = cursor.rowcount
+    conn.close()
+    if not updated:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    return {"reactivated": sub_id}
+
+@app.delete("/api/webhooks/{sub_id}")
+def delete_webhook(sub_id: int):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM webhook_subscriptions WHERE id = ?", (sub_id,))
+    conn.commit()
+    deleted = cursor.rowcount
+    conn.close()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    return {"deleted": sub_id}
+
+@app.post("/api/webhooks/flush")
+def flush_webhooks():
+    return {"delivered": dispatch_webhooks()}
+
+def select_requests(cursor, table, include_archived=False):
+    # Live queries only touch the hot table; history spans the archive too
+    if include_archived:
+        columns = TABLE_COLUMNS[table]
+        cursor.execute(f"SELECT {columns} FROM {table} UNION ALL SELECT {columns} FROM {table}_archive ORDER BY id DESC")
+    else:
+        cursor.execute(f"SELECT * FROM {table} ORDER BY id DESC")
+    return [dict(row) for row in cursor.fetchall()]
+
+@app.post("/api/archive")
+def archive_requests():
+    return {"archived": run_archiver()}
+
+def stream_rows(table, fmt, include_archived):
+    import csv
+    # Streaming responses resume on arbitrary threadpool workers, hence check_same_thread=False
+    conn = get_db(check_same_thread=False)
+    cursor = conn.cursor()
+    columns = EXPORT_COLUMNS[table]
+    if include_archived and table in TABLE_COLUMNS:
+        source = f"(SELECT {columns} FROM {table} UNION ALL SELECT {columns} FROM {table}_archive)"
+    else:
+        source = table
+    # Keyset pagination: each page is a short, fully consumed statement, so no read
+    # lock is held while the client is slow to read and writers are never blocked
+    sql = f"SELECT {columns} FROM {source} WHERE id > ? ORDER BY id LIMIT ?"
+    try:
+        cursor.execute(sql, (0, EXPORT_BATCH_SIZE))
+        rows = cursor.fetchall()
+        header = [d[0] for d in cursor.description]
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(header)
+        while rows:
+            if fmt == "csv":
+                writer.writerows(tuple(row) for row in rows)
+                chunk = buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+            else:
+                lines = []
+                for row in rows:
+                    row = dict(row)
+                    if "history" in row:
+                        row["history"] = json.loads(row["history"] or "[]")
+                    lines.append(json.dumps(row) + "\n")
+                chunk = "".join(lines)
+            last_id = rows[-1]["id"]
+            yield chunk
+            cursor.execute(sql, (last_id, EXPORT_BATCH_SIZE))
+            rows = cursor.fetchall()
+        if fmt == "csv" and buf.getvalue():
+            yield buf.getvalue()
+    finally:
+        conn.close()
+
+@app.get("/api/export/{table}")
+def export_table(table: str, format: str = "ndjson", include_archived: bool = False):
+    if table not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    return StreamingResponse(stream_rows(table, format, include_archived), media_type=media_type, headers=headers)
+
+def parse_import_line(table, line):
+    """Validate one NDJSON line and return its values in IMPORT_COLUMNS order.
+
+    Raises ValueError for anything that would not round-trip through the API,
+    so bad rows are reported per line instead of being stored.
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    values = []
+    for column, default in IMPORT_COLUMNS[table]:
+        value = record.get(column)
+        if value is None:
+            if default is None:
+                raise ValueError(f"Missing required field: {column}")
+        elif column in IMPORT_INT_COLUMNS:
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"{column} must be an integer")
+        elif column == "history":
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise ValueError("history must be a JSON list")
+            if not isinstance(value, list):
+                raise ValueError("history must be a JSON list")
+            value = json.dumps(value)
+        elif not isinstance(value, str):
+            raise ValueError(f"{column} must be a string")
+        elif column == "created_at":
+            # Stored as text and compared lexically by the archiver and search filters,
+            # so only SQLite's CURRENT_TIMESTAMP format (what export produces) is accepted
+            try:
+                datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                raise ValueError("created_at must be in 'YYYY-MM-DD HH:MM:SS' format")
+        elif column == "password" and value and not PASSWORD_HASH_RE.match(value):
+            # Pre-hashed `salt$hash` values are stored as-is; plaintext costs one PBKDF2 run per row
+            value = hash_psw(value)
+        values.append(value)
+    return values
+
+def insert_import_chunk(table, chunk):
+    """Validate and insert a chunk of (line_no, line) rows in one transaction.
+
+    The fast path is a single executemany; if any row violates a constraint the
+    chunk is replayed row by row so the offending lines can be reported.
+    """
+    columns = IMPORT_COLUMNS[table]
+    names = ", ".join(column for column, _ in columns)
+    params = ", ".join("?" if default is None else f"COALESCE(?, {default})" for _, default in columns)
+    sql = f"INSERT INTO {table} ({names}) VALUES ({params})"
+    errors = []
+    rows = []
+    for line_no, line in chunk:
+        try:
+            rows.append((line_no, parse_import_line(table, line)))
+        except ValueError as e:
+            errors.append({"line": line_no, "error": str(e)})
+    if not rows:
+        return 0, errors
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.executemany(sql, [values for _, values in rows])
+            conn.commit()
+            return len(rows), errors
+        except sqlite3.Error:
+            conn.rollback()
+        inserted = 0
+        for line_no, values in rows:
+            try:
+                cursor.execute(sql, values)
+                inserted += 1
+            except sqlite3.Error as e:
+                errors.append({"line": line_no, "error": str(e)})
         conn.commit()
+        return inserted, errors
+    finally:
+        conn.close()
+
+@app.post("/api/import/{table}")
+async def import_table(table: str, request: Request):
+    if table not in IMPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    inserted = 0
+    errors = []
+    chunk = []
+    line_no = 0
+    pending = b""
+
+    async def flush():
+        nonlocal inserted, chunk
+        if chunk:
+            count, chunk_errors = await run_in_threadpool(insert_import_chunk, table, chunk)
+            inserted += count
+            errors.extend(chunk_errors)
+            chunk = []
+
+    async def handle(line):
+        nonlocal line_no
+        line_no += 1
+        if not line.strip():
+            return
+        # Parsing happens in the threadpool with the insert, since password hashing is CPU-bound
+        chunk.append((line_no, line))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush()
+
+    async for data in request.stream():
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            await handle(line)
+    if pending:
+        await handle(pending)
+    await flush()
+    errors.sort(key=lambda e: e["line"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
 
 @app.post("/api/donations")
 def create_donation(req: DonationRequest, request: Request, background_tasks: BackgroundTasks):
+    rate_keys = [("sender", req.email), ("restaurant", req.restaurant)]
+    return guarded_write(request, "donations", req.dict(), rate_keys, lambda: save_donation(req, request, background_tasks))
+
+def save_donation(req, request, background_tasks):
     base_url = str(request.base_url).rstrip("/")
     conn = get_db()
     cursor = conn.cursor()
@@ -425,11 +1259,10 @@ def list_ngos():
     return rows
 
 @app.get("/api/donations")
-def list_donations():
+def list_donations(include_archived: bool = False):
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM requests ORDER BY id DESC")
-    rows = [dict(row) for row in cursor.fetchall()]
+    rows = select_requests(cursor, "requests", include_archived)
     conn.close()
     for row in rows:
         row["history"] = json.loads(row["history"])
@@ -437,6 +1270,10 @@ def list_donations():
 
 @app.post("/api/ngo-requests")
 def create_ngo_request(req: NGOFoodRequest, request: Request, background_tasks: BackgroundTasks):
+    rate_keys = [("ngo", req.ngo_email)]
+    return guarded_write(request, "ngo-requests", req.dict(), rate_keys, lambda: save_ngo_request(req, request, background_tasks))
+
+def save_ngo_request(req, request, background_tasks):
     base_url = str(request.base_url).rstrip("/")
     conn = get_db()
     cursor = conn.cursor()
@@ -521,13 +1358,72 @@ def create_ngo_request(req: NGOFoodRequest, request: Request, background_tasks:
     
     return {"message": status_msg, "request": new_req}
 
-@app.get("/api/ngo-requests")
-def list_ngo_requests():
+def build_match_query(q):
+    # Quote each word so user punctuation can't break FTS5 syntax; prefix-match every term
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+@app.get("/api/search")
+def search_requests(q: str, scope: str = "donations", status: str = None, date_from: str = None, date_to: str = None, page: int = 1, page_size: int = 20, include_archived: bool = False):
+    if scope not in SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail="scope must be 'donations' or 'ngo_requests'")
+    match = build_match_query(q)
+    if not match:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), SEARCH_MAX_PAGE_SIZE)
+
+    table = SEARCH_SCOPES[scope]
+    columns = ", ".join(f"r.{column.strip()}" for column in TABLE_COLUMNS[table].split(","))
+    sources = [table, f"{table}_archive"] if include_archived else [table]
+    selects = []
+    params = []
+    # Archived rows have their own FTS index; each source is matched and filtered separately.
+    # bm25 scores from the two indexes use different term statistics, so the merged
+    # ordering is approximate when include_archived is set.
+    for source in sources:
+        fts = f"{source}_fts"
+        select = f"SELECT {columns}, bm25({fts}) AS rank FROM {fts} JOIN {source} r ON r.id = {fts}.rowid WHERE {fts} MATCH ?"
+        params.append(match)
+        if status:
+            select += " AND r.status = ?"
+            params.append(status)
+        if date_from:
+            select += " AND r.created_at >= ?"
+            params.append(date_from)
+        if date_to:
+            select += " AND r.created_at < date(?, '+1 day')"
+            params.append(date_to)
+        selects.append(select)
+    # Fetch one extra row to report has_more without a COUNT over the whole match set
+    sql = " UNION ALL ".join(selects) + " ORDER BY rank LIMIT ? OFFSET ?"
+    params += [page_size + 1, (page - 1) * page_size]
+
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM ngo_requests ORDER BY id DESC")
+    cursor.execute(sql, params)
     rows = [dict(row) for row in cursor.fetchall()]
     conn.close()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    for row in rows:
+        # rank is only for ordering; results have the same shape as /api/donations
+        row.pop("rank")
+        row["history"] = json.loads(row["history"])
+    return {"results": rows, "page": page, "page_size": page_size, "has_more": has_more}
+
+@app.get("/api/ngo-requests")
+def list_ngo_requests(include_archived: bool = False):
+    conn = get_db()
+    cursor = conn.cursor()
+    rows = select_requests(cursor, "ngo_requests", include_archived)
+    conn.close()
     for row in rows:
         row["history"] = json.loads(row["history"])
     return rows
@@ -541,9 +1437,16 @@ def fulfill_ngo_request(decision: str, requestId: int, restaurantId: int, reques
     req = cursor.fetchone()
     
     if not req:
+        # Closed requests may already have been moved to the archive
+        cursor.execute("SELECT id FROM ngo_requests_archive WHERE id = ?", (requestId,))
+        archived = cursor.fetchone()
+        conn.close()
+        if archived:
+            return HTMLResponse(content="<h1>This request has already been closed. Thanks anyway!</h1>")
         return HTMLResponse(content="<h1>Request not found</h1>")
         
     if req["status"] in ["Accepted"]:
+        conn.close()
         # Tell this restaurant it's already fulfilled
         return HTMLResponse(content="<h1>This request has already been fulfilled by another restaurant. Thanks anyway!</h1>")
         
@@ -651,9 +1554,16 @@ def handle_response(decision: str, requestId: int, request: Request, background_
     req = cursor.fetchone()
     
     if not req:
+        # Closed requests may already have been moved to the archive
+        cursor.execute("SELECT id FROM requests_archive WHERE id = ?", (requestId,))
+        if cursor.fetchone():
+            conn.close()
+            return {"message": "Request already processed."}
+        conn.close()
         return {"error": "Request not found"}
         
     if req["status"] in ["Accepted"]:
+        conn.close()
         return {"message": "Request already processed."}
         
     current_ngo = req["ngoAssigned"]
@@ -794,3 +1704,12 @@ def get_index():
     with open("index.html", "r", encoding="utf-8") as f:
         html = f.read()
     return HTMLResponse(content=html)
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["migrate"]:
+        old_version, new_version = migrate_db()
+        print(f"Database {DB_FILE} at schema version {new_version} (was {old_version}).")
+    else:
+        print("Usage: python main.py migrate")
+        sys.exit(1)